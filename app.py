@@ -1,102 +1,254 @@
 from fastapi import FastAPI, Request, Form, Depends, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-import requests
-import json
+import httpx
+import jinja2
+import asyncio
+import orjson
+import msgspec
 import os
+import time
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional, List
+from typing import Optional, List, Dict
 from contextlib import asynccontextmanager
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Load config on startup
+    # Upgrade old credentials once, then warm the config cache
+    _migrate_if_needed()
     config = load_config()
-    if config.get("active_key"):
-        current_config["api_key"] = config["active_key"]
+    if config.active_key:
+        current_config["api_key"] = config.active_key
+    # Compile templates up front so the first request doesn't pay for parsing
+    for name in TEMPLATE_NAMES:
+        templates.env.get_template(name)
+    # Shared client so upstream calls reuse pooled keep-alive connections
+    app.state.http = httpx.AsyncClient(
+        base_url=API_BASE,
+        http2=True,
+        timeout=httpx.Timeout(10.0, connect=3.0),
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100)
+    )
+    # Open and handshake a connection now so the first real request reuses it
+    try:
+        await app.state.http.get("/health", timeout=2.0)
+    except Exception:
+        pass
     yield
+    await app.state.http.aclose()
 
 app = FastAPI(title="Clawbook for Humans", lifespan=lifespan)
 
 # Setup paths
 BASE_DIR = Path(__file__).parent
 templates = Jinja2Templates(directory=BASE_DIR / "templates")
+TEMPLATE_NAMES = ["index.html", "post.html", "login.html", "register.html", "my_posts.html", "register_success.html"]
+
+if os.environ.get("ENV") == "prod":
+    # Templates don't change in production, skip mtime checks and cache bytecode
+    cache_dir = BASE_DIR / ".jinja_cache"
+    cache_dir.mkdir(exist_ok=True)
+    templates.env.auto_reload = False
+    templates.env.bytecode_cache = jinja2.FileSystemBytecodeCache(str(cache_dir))
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles that lets browsers reuse files instead of re-requesting them"""
+
+    def __init__(self, *args, cache_control: str = "public, max-age=86400", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = cache_control
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = self.cache_control
+        return response
 
 # Mount static files
-app.mount("/assets", StaticFiles(directory=BASE_DIR / "assets"), name="assets")
-app.mount("/static", StaticFiles(directory=BASE_DIR / "static"), name="static")
+app.mount("/assets", CachedStaticFiles(directory=BASE_DIR / "assets"), name="assets")
+app.mount("/static", CachedStaticFiles(directory=BASE_DIR / "static"), name="static")
 
 # Constants
 API_BASE = "https://www.moltbook.com/api/v1"
 CONFIG_FILE = Path(__file__).parent / "credentials.json"
 
+class Agent(msgspec.Struct):
+    api_key: str
+    agent_name: Optional[str] = "Unknown"
+    claim_url: Optional[str] = None
+    verification_code: Optional[str] = None
+
+class Config(msgspec.Struct):
+    active_key: Optional[str] = None
+    agents: Dict[str, Agent] = {}
+
 # State
 current_config = {"api_key": None}
+# Parsed credentials; this process is the only writer so it never goes stale
+_config_cache = None
+# api_key -> prebuilt request headers, saved agents only
+_auth_headers = {}
+# api_key -> (fetched_at, submolts), least recently used first
+_submolts_cache = OrderedDict()
+SUBMOLTS_TTL = 60
+SUBMOLTS_CACHE_SIZE = 100
+# Last bytes flushed to CONFIG_FILE, used to skip identical rewrites
+_last_written_bytes = None
 
-def load_config():
-    if CONFIG_FILE.exists():
+def _migrate_if_needed():
+    """Upgrade older credential formats once at startup and warm the cache"""
+    global _config_cache
+    try:
+        config = msgspec.json.decode(CONFIG_FILE.read_bytes())
+    except (FileNotFoundError, msgspec.DecodeError):
+        _config_cache = Config()
+        return
+    if not isinstance(config, dict):
+        _config_cache = Config()
+        return
+
+    migrated = False
+    # Migration if it's the old format (dict but not list)
+    if "api_key" in config and "agents" not in config:
+        config = {
+            "active_key": config["api_key"],
+            "agents": [config]
+        }
+        migrated = True
+    entries = config.get("agents") or {}
+    # Migration from a list of agents to agents keyed by api_key
+    if isinstance(entries, list):
+        entries = {i: a for i, a in enumerate(entries)}
+        migrated = True
+    elif not isinstance(entries, dict):
+        entries = {}
+        migrated = True
+
+    # Validate agents one by one so a single bad entry doesn't drop the rest
+    agents = {}
+    for entry in entries.values():
         try:
-            with open(CONFIG_FILE, 'r') as f:
-                config = json.load(f)
-                # Migration if it's the old format (dict but not list)
-                if isinstance(config, dict) and "api_key" in config and "agents" not in config:
-                    new_config = {
-                        "active_key": config["api_key"],
-                        "agents": [config]
-                    }
-                    save_config(new_config)
-                    return new_config
-                return config
-        except:
-            return {"active_key": None, "agents": []}
-    return {"active_key": None, "agents": []}
+            agent = msgspec.convert(entry, type=Agent)
+        except msgspec.ValidationError:
+            migrated = True
+            continue
+        if agent.api_key:
+            agents[agent.api_key] = agent
+
+    active_key = config.get("active_key")
+    if not isinstance(active_key, str):
+        active_key = None
+    config = Config(active_key=active_key, agents=agents)
+    if migrated:
+        save_config(config)
+    else:
+        _config_cache = config
+
+def load_config():
+    if _config_cache is None:
+        _migrate_if_needed()
+    return _config_cache
 
 def save_config(config):
-    with open(CONFIG_FILE, 'w') as f:
-        json.dump(config, f, indent=2)
+    global _config_cache, _last_written_bytes
+    # The cache only takes the new config once it is safely on disk
+    data = msgspec.json.format(msgspec.json.encode(config), indent=2)
+    if data == _last_written_bytes:
+        _config_cache = config
+        return
+    # Write and fsync a temp file, then swap it in so a crash never leaves a torn file
+    tmp_file = CONFIG_FILE.with_suffix(".json.tmp")
+    try:
+        with open(tmp_file, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, CONFIG_FILE)
+    except BaseException:
+        tmp_file.unlink(missing_ok=True)
+        raise
+    _config_cache = config
+    _last_written_bytes = data
 
-def add_agent_to_config(agent_data):
+def add_agent_to_config(agent: Agent):
+    if not isinstance(agent.api_key, str) or not agent.api_key:
+        raise ValueError("Agent is missing an API key")
     config = load_config()
-    agents = config.get("agents", [])
-    
-    # Check if exists, update or add
-    found = False
-    for i, a in enumerate(agents):
-        if a.get("api_key") == agent_data.get("api_key"):
-            agents[i] = agent_data
-            found = True
-            break
-    
-    if not found:
-        agents.append(agent_data)
-    
-    config["agents"] = agents
-    config["active_key"] = agent_data.get("api_key")
+    # Agents are keyed by api_key, so this both adds and updates. Build a new
+    # Config rather than mutating the cached one in case the save fails.
+    config = msgspec.structs.replace(
+        config,
+        active_key=agent.api_key,
+        agents={**config.agents, agent.api_key: agent}
+    )
     save_config(config)
-    current_config["api_key"] = config["active_key"]
+    current_config["api_key"] = config.active_key
 
-def get_session(api_key: str):
-    s = requests.Session()
-    s.headers.update({"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"})
-    return s
+def json_error(error: str, status_code: int = 400):
+    return Response(orjson.dumps({"error": error}), status_code=status_code, media_type="application/json")
+
+def wants_json(request: Request):
+    """True for HTMX or JSON clients that only need the error, not a full page"""
+    return (
+        request.headers.get("hx-request") == "true"
+        or "application/json" in request.headers.get("accept", "")
+    )
+
+def add_agent_error(request: Request, error: str, status_code: int = 400):
+    if wants_json(request):
+        return json_error(error, status_code)
+    return templates.TemplateResponse("index.html", {
+        "request": request,
+        "api_key": current_config.get("api_key"),
+        "error": error,
+        "saved_agents": load_config().agents,
+        "agent": None,
+        "status": None
+    })
+
+def register_error(request: Request, error: str, status_code: int = 400):
+    if wants_json(request):
+        return json_error(error, status_code)
+    return templates.TemplateResponse("register.html", {"request": request, "error": error})
+
+def auth_headers(api_key: str):
+    headers = _auth_headers.get(api_key)
+    if headers is None:
+        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        # Only remember saved agents, keys still being verified may be rejected
+        if api_key in load_config().agents:
+            _auth_headers[api_key] = headers
+    return headers
+
+async def get_submolts(client: httpx.AsyncClient, api_key: str):
+    cached = _submolts_cache.get(api_key)
+    if cached and time.monotonic() - cached[0] < SUBMOLTS_TTL:
+        _submolts_cache.move_to_end(api_key)
+        return cached[1]
 
-@app.get("/post", response_class=HTMLResponse)
-async def post_page(request: Request):
-    api_key = current_config.get("api_key")
-    if not api_key:
-        return RedirectResponse(url="/login")
-    
-    submolts = []
-    s = get_session(api_key)
     try:
-        res = s.get(f"{API_BASE}/submolts")
+        res = await client.get("/submolts", headers=auth_headers(api_key))
         if res.status_code == 200:
-            data = res.json()
+            data = orjson.loads(res.content)
             # Try to find the list in common response keys
             submolts = data.get("submolts") or data.get("data", {}).get("submolts") or []
+            _submolts_cache[api_key] = (time.monotonic(), submolts)
+            _submolts_cache.move_to_end(api_key)
+            if len(_submolts_cache) > SUBMOLTS_CACHE_SIZE:
+                _submolts_cache.popitem(last=False)
+            return submolts
     except Exception as e:
         print(f"Error fetching submolts: {e}")
+    return []
+
+@app.get("/post", response_class=HTMLResponse)
+async def post_page(request: Request):
+    api_key = current_config.get("api_key")
+    if not api_key:
+        return RedirectResponse(url="/login")
+    
+    submolts = await get_submolts(request.app.state.http, api_key)
 
     return templates.TemplateResponse("post.html", {
         "request": request, 
@@ -111,17 +263,19 @@ async def index(request: Request):
     status_info = None
     
     if api_key:
-        s = get_session(api_key)
+        client = request.app.state.http
+        headers = auth_headers(api_key)
+        # Stats and status are independent, fetch them concurrently
+        res, res_status = await asyncio.gather(
+            client.get("/agents/me", headers=headers),
+            client.get("/agents/status", headers=headers),
+            return_exceptions=True
+        )
         try:
-            # Get stats
-            res = s.get(f"{API_BASE}/agents/me")
-            if res.status_code == 200:
-                agent_info = res.json().get("agent")
-            
-            # Get status
-            res_status = s.get(f"{API_BASE}/agents/status")
-            if res_status.status_code == 200:
-                status_info = res_status.json()
+            if not isinstance(res, Exception) and res.status_code == 200:
+                agent_info = orjson.loads(res.content).get("agent")
+            if not isinstance(res_status, Exception) and res_status.status_code == 200:
+                status_info = orjson.loads(res_status.content)
         except:
             pass
 
@@ -130,7 +284,7 @@ async def index(request: Request):
         "agent": agent_info, 
         "status": status_info,
         "api_key": api_key,
-        "saved_agents": config.get("agents", [])
+        "saved_agents": config.agents
     })
 
 @app.get("/login", response_class=HTMLResponse)
@@ -138,77 +292,61 @@ async def login_page(request: Request):
     return templates.TemplateResponse("login.html", {"request": request})
 
 @app.post("/login")
-async def login(api_key: str = Form(...)):
-    s = get_session(api_key)
+async def login(request: Request, api_key: str = Form(...)):
+    client = request.app.state.http
     agent_name = "Unknown"
     try:
-        res = s.get(f"{API_BASE}/agents/me")
+        res = await client.get("/agents/me", headers=auth_headers(api_key))
         if res.status_code == 200:
-            agent_name = res.json().get("agent", {}).get("name")
+            agent_name = orjson.loads(res.content).get("agent", {}).get("name")
     except:
         pass
 
-    add_agent_to_config({
-        "api_key": api_key,
-        "agent_name": agent_name
-    })
+    add_agent_to_config(Agent(api_key=api_key, agent_name=agent_name))
         
     return RedirectResponse(url="/", status_code=303)
 
 @app.post("/add-agent")
 async def add_agent(request: Request, api_key: str = Form(...)):
     """Add an existing agent using API key"""
-    s = get_session(api_key)
+    client = request.app.state.http
     agent_name = "Unknown"
-    config = load_config()
     try:
-        res = s.get(f"{API_BASE}/agents/me")
+        res = await client.get("/agents/me", headers=auth_headers(api_key))
         if res.status_code == 200:
-            agent_name = res.json().get("agent", {}).get("name")
+            agent_name = orjson.loads(res.content).get("agent", {}).get("name")
             # Successfully verified the API key, add it to config
-            add_agent_to_config({
-                "api_key": api_key,
-                "agent_name": agent_name
-            })
+            add_agent_to_config(Agent(api_key=api_key, agent_name=agent_name))
             return RedirectResponse(url="/", status_code=303)
         else:
             # Return to index with error
-            return templates.TemplateResponse("index.html", {
-                "request": request,
-                "api_key": current_config.get("api_key"),
-                "error": "Invalid API key or agent not found",
-                "saved_agents": config.get("agents", []),
-                "agent": None,
-                "status": None
-            })
+            return add_agent_error(request, "Invalid API key or agent not found")
     except Exception as e:
-        return templates.TemplateResponse("index.html", {
-            "request": request,
-            "api_key": current_config.get("api_key"),
-            "error": f"Failed to add agent: {str(e)}",
-            "saved_agents": config.get("agents", []),
-            "agent": None,
-            "status": None
-        })
+        return add_agent_error(request, f"Failed to add agent: {str(e)}", 502)
 
 @app.post("/switch/{api_key}")
 async def switch_agent(api_key: str):
     config = load_config()
+    # Already active, nothing to write
+    if config.active_key == api_key and current_config["api_key"] == api_key:
+        return RedirectResponse(url="/", status_code=303)
     # verify it exists in our saved agents
-    if any(a.get("api_key") == api_key for a in config.get("agents", [])):
-        config["active_key"] = api_key
-        save_config(config)
+    if api_key in config.agents:
+        save_config(msgspec.structs.replace(config, active_key=api_key))
         current_config["api_key"] = api_key
     return RedirectResponse(url="/", status_code=303)
 
 @app.post("/delete/{api_key}")
 async def delete_agent(api_key: str):
     config = load_config()
-    config["agents"] = [a for a in config.get("agents", []) if a.get("api_key") != api_key]
-    if config.get("active_key") == api_key:
-        config["active_key"] = config["agents"][0].get("api_key") if config["agents"] else None
+    agents = {k: a for k, a in config.agents.items() if k != api_key}
+    active_key = config.active_key
+    if active_key == api_key:
+        active_key = next(iter(agents), None)
+    config = msgspec.structs.replace(config, active_key=active_key, agents=agents)
     save_config(config)
-    current_config["api_key"] = config["active_key"]
+    _auth_headers.pop(api_key, None)
+    current_config["api_key"] = config.active_key
     return RedirectResponse(url="/", status_code=303)
 
 @app.get("/register", response_class=HTMLResponse)
@@ -218,34 +356,40 @@ async def register_page(request: Request):
 @app.post("/register")
 async def register(request: Request, name: str = Form(...), description: str = Form("")):
     try:
-        res = requests.post(f"{API_BASE}/agents/register", json={"name": name, "description": description})
+        res = await request.app.state.http.post(
+            "/agents/register",
+            content=orjson.dumps({"name": name, "description": description}),
+            headers={"Content-Type": "application/json"}
+        )
         res.raise_for_status()
-        data = res.json()
+        data = orjson.loads(res.content)
         agent = data.get("agent", {})
+        if not isinstance(agent.get("api_key"), str) or not agent.get("api_key"):
+            return register_error(request, "Registration succeeded but no API key was returned", 502)
         
         # Save and set current
-        add_agent_to_config({
-            "api_key": agent.get("api_key"),
-            "agent_name": name,
-            "claim_url": agent.get("claim_url"),
-            "verification_code": agent.get("verification_code")
-        })
+        add_agent_to_config(Agent(
+            api_key=agent.get("api_key"),
+            agent_name=name,
+            claim_url=agent.get("claim_url"),
+            verification_code=agent.get("verification_code")
+        ))
         
         return templates.TemplateResponse("register_success.html", {
             "agent": agent,
             "request": request
         })
-    except requests.exceptions.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         error_msg = str(e)
         try:
-            error_data = e.response.json()
+            error_data = orjson.loads(e.response.content)
             if error_data.get("error"):
                 error_msg = f"{error_data['error']} (Hint: {error_data.get('hint', 'Try a different name')})"
         except:
             pass
-        return templates.TemplateResponse("register.html", {"request": request, "error": error_msg})
+        return register_error(request, error_msg)
     except Exception as e:
-        return templates.TemplateResponse("register.html", {"request": request, "error": str(e)})
+        return register_error(request, str(e), 502)
 
 
 @app.get("/my-post")
@@ -263,18 +407,17 @@ async def my_posts(request: Request):
     
     # Get agent name from credentials
     config = load_config()
-    for agent in config.get("agents", []):
-        if agent.get("api_key") == api_key:
-            agent_name = agent.get("agent_name", "Unknown")
-            break
+    agent = config.agents.get(api_key)
+    if agent:
+        agent_name = agent.agent_name or "Unknown"
     
     # Use the profile API to get posts
     if agent_name != "Unknown":
+        client = request.app.state.http
         try:
-            profile_url = f"{API_BASE}/agents/profile?name={agent_name.lower()}"
-            res = requests.get(profile_url)
+            res = await client.get("/agents/profile", params={"name": agent_name.lower()})
             if res.status_code == 200:
-                data = res.json()
+                data = orjson.loads(res.content)
                 if data.get("success"):
                     posts = data.get("recentPosts", [])
         except Exception as e:
@@ -298,17 +441,11 @@ async def create_post(
     if not api_key:
         return RedirectResponse(url="/login")
     
-    s = get_session(api_key)
+    client = request.app.state.http
+    headers = auth_headers(api_key)
     
-    # Pre-fetch submolts for re-rendering if needed
-    submolts = []
-    try:
-        res_subs = s.get(f"{API_BASE}/submolts")
-        if res_subs.status_code == 200:
-            subs_data = res_subs.json()
-            submolts = subs_data.get("submolts") or subs_data.get("data", {}).get("submolts") or []
-    except:
-        pass
+    # Fetch submolts for re-rendering alongside the post instead of before it
+    subs_task = asyncio.create_task(get_submolts(client, api_key))
 
     payload = {"title": title, "submolt": submolt}
     if url:
@@ -317,15 +454,15 @@ async def create_post(
         payload["content"] = content
         
     try:
-        res = s.post(f"{API_BASE}/posts", json=payload)
+        res = await client.post("/posts", content=orjson.dumps(payload), headers=headers)
         if res.status_code in [200, 201]:
             return templates.TemplateResponse("post.html", {
                 "request": request, 
                 "success": "Post created successfully! It may take a few minutes to appear in your posts list.",
-                "submolts": submolts
+                "submolts": await subs_task
             })
         else:
-            error_data = res.json() if res.headers.get('content-type', '').startswith('application/json') else {}
+            error_data = orjson.loads(res.content) if res.headers.get('content-type', '').startswith('application/json') else {}
             error_msg = error_data.get("error", f"HTTP {res.status_code}: {res.text}")
             hint = error_data.get("hint", "")
             if hint:
@@ -333,42 +470,45 @@ async def create_post(
             return templates.TemplateResponse("post.html", {
                 "request": request, 
                 "error": error_msg,
-                "submolts": submolts
+                "submolts": await subs_task
             })
     except Exception as e:
         return templates.TemplateResponse("post.html", {
             "request": request, 
             "error": f"An error occurred: {str(e)}",
-            "submolts": submolts
+            "submolts": await subs_task
         })
+    finally:
+        # Don't leave the fetch running if the post is cancelled mid-flight
+        if not subs_task.done():
+            subs_task.cancel()
 
 @app.get("/api/agent/profile")
-async def get_agent_profile():
+async def get_agent_profile(request: Request):
     """Get current agent's profile data including posts"""
     api_key = current_config.get("api_key")
     if not api_key:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
-    s = get_session(api_key)
+    client = request.app.state.http
     
     try:
         # Get agent info
-        res = s.get(f"{API_BASE}/agents/me")
+        res = await client.get("/agents/me", headers=auth_headers(api_key))
         if res.status_code != 200:
             raise HTTPException(status_code=400, detail="Failed to get agent info")
         
-        agent_data = res.json().get("agent", {})
+        agent_data = orjson.loads(res.content).get("agent", {})
         agent_name = agent_data.get("name")
         
         if not agent_name:
             raise HTTPException(status_code=400, detail="Agent name not found")
         
         # Get profile with posts
-        profile_url = f"{API_BASE}/agents/profile?name={agent_name.lower()}"
-        profile_res = requests.get(profile_url)
+        profile_res = await client.get("/agents/profile", params={"name": agent_name.lower()})
         
         if profile_res.status_code == 200:
-            profile_data = profile_res.json()
+            profile_data = orjson.loads(profile_res.content)
             if profile_data.get("success"):
                 return profile_data
         
@@ -382,11 +522,23 @@ async def get_agent_profile():
 @app.post("/logout")
 async def logout():
     config = load_config()
-    config["active_key"] = None
-    save_config(config)
+    # Already logged out, nothing to write
+    if config.active_key is None and current_config["api_key"] is None:
+        return RedirectResponse(url="/login", status_code=303)
+    save_config(msgspec.structs.replace(config, active_key=None))
     current_config["api_key"] = None
     return RedirectResponse(url="/login", status_code=303)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
+    # Agent state lives in this process, so run a single worker unless told otherwise
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=8000,
+        # Picks uvloop and httptools when installed, falls back on e.g. Windows
+        loop="auto",
+        http="auto",
+        workers=int(os.environ.get("WEB_CONCURRENCY", "1")),
+        reload=os.environ.get("DEV", "").lower() in ("1", "true", "yes")
+    )